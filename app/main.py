@@ -14,29 +14,65 @@ This FastAPI application analyzes sensor data (accelerometer) using an autoencod
 """
 
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import msgspec
+from typing import Annotated
 import numpy as np
-import pandas as pd
+from numba import njit
 import datetime
 import joblib
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+import tensorflow as tf
 from tensorflow.keras.models import load_model
 import logging
-import psycopg2
-from psycopg2 import pool
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool
 from apscheduler.schedulers.background import BackgroundScheduler
 from influxdb_client import InfluxDBClient, Point
-from fastapi.responses import StreamingResponse
-import matplotlib.pyplot as plt
+from influxdb_client.client.write_api import WriteOptions
+from fastapi.responses import Response
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+import threading
+import time
+import math
 import io
+import tempfile
+import hashlib
+import shutil
+from collections import deque, OrderedDict
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Application Lifespan
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Starts background workers on startup and stops them on shutdown.
+    """
+    global inference_queue
+    inference_queue = asyncio.Queue()
+    batcher_task = asyncio.create_task(inference_batcher())
+    scheduler.add_job(flush_anomaly_rows, "interval", seconds=ANOMALY_FLUSH_INTERVAL)
+    scheduler.start()
+    yield
+    batcher_task.cancel()
+    scheduler.shutdown()
+    flush_anomaly_rows()
+    db_pool.close()
+    write_api.close()
+    client.close()
+
+
 # FastAPI Initialization
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware Setup
 app.add_middleware(
@@ -54,6 +90,45 @@ logger = logging.getLogger(__name__)
 # Load Models and Scaler
 AUTOENCODER_MODEL_PATH = os.getenv("AUTOENCODER_MODEL_PATH")
 SCALER_MODEL_PATH = os.getenv("SCALER_MODEL_PATH")
+AUTOENCODER_BACKENDS = ("onnx", "keras", "tfserving")
+AUTOENCODER_BACKEND = os.getenv("AUTOENCODER_BACKEND", "onnx")
+TRT_PRECISION = os.getenv("TRT_PRECISION", "fp16")  # "fp32", "fp16" or "int8"
+TRT_ENGINE_CACHE_PATH = os.getenv("TRT_ENGINE_CACHE_PATH", "trt_cache")
+TRT_INT8_CALIBRATION_TABLE = os.getenv("TRT_INT8_CALIBRATION_TABLE")
+MAX_BATCH_SIZE = 32  # largest micro-batch sent to the autoencoder in one call
+
+if AUTOENCODER_BACKEND not in AUTOENCODER_BACKENDS:
+    logger.error(f"Unknown AUTOENCODER_BACKEND {AUTOENCODER_BACKEND!r}; expected one of {AUTOENCODER_BACKENDS}.")
+    raise ValueError(f"Unknown AUTOENCODER_BACKEND: {AUTOENCODER_BACKEND!r}")
+
+
+def tensorrt_provider_options():
+    """
+    Builds TensorRT execution provider options for the configured precision.
+    Returns:
+        dict: Options for onnxruntime's TensorrtExecutionProvider.
+    """
+    options = {
+        "trt_engine_cache_enable": True,
+        "trt_engine_cache_path": TRT_ENGINE_CACHE_PATH,
+        # INT8 keeps FP16 enabled for layers TensorRT cannot quantize
+        "trt_fp16_enable": TRT_PRECISION in ("fp16", "int8"),
+    }
+    if TRT_PRECISION == "int8":
+        if TRT_INT8_CALIBRATION_TABLE:
+            # The table is looked up inside the engine cache directory
+            options["trt_int8_enable"] = True
+            options["trt_int8_calibration_table_name"] = TRT_INT8_CALIBRATION_TABLE
+        else:
+            logger.warning("TRT_PRECISION=int8 requires TRT_INT8_CALIBRATION_TABLE; using FP16 instead.")
+    return options
+
+
+ONNX_PROVIDERS = [
+    ("TensorrtExecutionProvider", tensorrt_provider_options()),
+    "CUDAExecutionProvider",
+    "CPUExecutionProvider",
+]
 
 try:
     autoencoder = load_model(AUTOENCODER_MODEL_PATH)
@@ -62,6 +137,161 @@ except Exception as e:
     logger.error(f"Error loading autoencoder model: {e}")
     raise
 
+
+# XLA-compile the Keras path; the ONNX export needs a plain graph
+@tf.function(input_signature=[tf.TensorSpec((None, 24, 1), tf.float32)], jit_compile=AUTOENCODER_BACKEND == "keras")
+def _infer_err(x):
+    # Reduce to the per-window mean absolute reconstruction error inside the graph
+    return tf.reduce_mean(tf.abs(autoencoder(x, training=False) - x), axis=[1, 2])
+
+
+# Trace the graph once so the first request does not pay for it
+if AUTOENCODER_BACKEND == "keras":
+    # XLA compiles per shape; warm every power-of-two batch compute_reconstruction_errors can pad to
+    for warmup_batch in [1 << i for i in range((MAX_BATCH_SIZE - 1).bit_length() + 1)]:
+        _infer_err(tf.zeros((warmup_batch, 24, 1), tf.float32))
+else:
+    _infer_err(tf.zeros((1, 24, 1), tf.float32))
+
+
+def init_onnx_session():
+    """
+    Exports the autoencoder to ONNX and opens an ONNX Runtime session on it.
+    Returns:
+        onnxruntime.InferenceSession: Session using the best available execution provider.
+    """
+    # from_keras does not handle Keras 3 models, so export the traced function instead.
+    # The model is kept in memory so concurrent workers never race on a shared file.
+    model_proto, _ = tf2onnx.convert.from_function(_infer_err, input_signature=_infer_err.input_signature)
+    available = ort.get_available_providers()
+    providers = [p for p in ONNX_PROVIDERS if (p[0] if isinstance(p, tuple) else p) in available]
+    return ort.InferenceSession(model_proto.SerializeToString(), providers=providers)
+
+
+if AUTOENCODER_BACKEND == "onnx":
+    # Optional dependencies: tf2onnx and onnxruntime are only needed for this backend
+    import tf2onnx
+    import onnxruntime as ort
+
+    try:
+        sess = init_onnx_session()
+        in_name = sess.get_inputs()[0].name
+        logger.info(f"ONNX Runtime session initialized with providers: {sess.get_providers()}")
+    except Exception as e:
+        logger.error(f"Error initializing ONNX Runtime session: {e}")
+        raise
+
+# TensorFlow Serving Configuration
+TF_SERVING_MODEL_DIR = os.getenv("TF_SERVING_MODEL_DIR", "saved_model")
+TF_SERVING_MODEL_NAME = os.getenv("TF_SERVING_MODEL_NAME", "ae")
+TF_SERVING_GRPC_TARGET = os.getenv("TF_SERVING_GRPC_TARGET", "localhost:8500")
+TF_SERVING_TIMEOUT = 5.0  # seconds per Predict call
+
+
+SAVED_MODEL_FINGERPRINT_FILE = os.path.join("assets.extra", "fingerprint.sha256")
+
+
+def saved_model_fingerprint():
+    """
+    Hashes the Keras model file and the traced error graph, which together determine the SavedModel.
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(AUTOENCODER_MODEL_PATH):
+        model_files = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(AUTOENCODER_MODEL_PATH) for name in names
+        )
+    else:
+        model_files = [AUTOENCODER_MODEL_PATH]
+    for path in model_files:
+        digest.update(os.path.relpath(path, AUTOENCODER_MODEL_PATH).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    graph_def = _infer_err.get_concrete_function().graph.as_graph_def()
+    digest.update(graph_def.SerializeToString(deterministic=True))
+    return digest.hexdigest()
+
+
+def latest_saved_model_version(fingerprint):
+    """
+    Finds the newest exported version and checks whether it was built from the same model.
+    Args:
+        fingerprint (str): Fingerprint of the model about to be exported.
+    Returns:
+        tuple: (newest version number or 0, whether that version matches the fingerprint).
+    """
+    versions = [int(name) for name in os.listdir(TF_SERVING_MODEL_DIR) if name.isdigit()]
+    version = max(versions, default=0)
+    if not version:
+        return 0, False
+    try:
+        with open(os.path.join(TF_SERVING_MODEL_DIR, str(version), SAVED_MODEL_FINGERPRINT_FILE)) as f:
+            return version, f.read().strip() == fingerprint
+    except OSError:
+        return version, False
+
+
+def export_saved_model():
+    """
+    Exports the error-computing graph as a new SavedModel version for TensorFlow Serving, unless the
+    newest version already holds the same model. The model is written to a temporary directory first
+    and then renamed into place, so the server never sees a partially written version.
+    Returns:
+        tuple: (version number being served, whether it was exported by this call).
+    """
+    os.makedirs(TF_SERVING_MODEL_DIR, exist_ok=True)
+    fingerprint = saved_model_fingerprint()
+    version, unchanged = latest_saved_model_version(fingerprint)
+    if unchanged:
+        return version, False
+    module = tf.Module()
+    module.autoencoder = autoencoder
+    module.infer_err = _infer_err
+    # TF Serving only picks up numeric directories, so the temporary one is ignored
+    tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=TF_SERVING_MODEL_DIR)
+    try:
+        tf.saved_model.save(module, tmp_dir, signatures=_infer_err.get_concrete_function())
+        os.makedirs(os.path.join(tmp_dir, os.path.dirname(SAVED_MODEL_FINGERPRINT_FILE)), exist_ok=True)
+        with open(os.path.join(tmp_dir, SAVED_MODEL_FINGERPRINT_FILE), "w") as f:
+            f.write(fingerprint)
+        while True:
+            version, unchanged = latest_saved_model_version(fingerprint)
+            if unchanged:
+                # Another worker exported the same model meanwhile
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return version, False
+            try:
+                os.replace(tmp_dir, os.path.join(TF_SERVING_MODEL_DIR, str(version + 1)))
+                return version + 1, True
+            except OSError:
+                # Another worker claimed this version number first
+                if not os.path.isdir(os.path.join(TF_SERVING_MODEL_DIR, str(version + 1))):
+                    raise
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+if AUTOENCODER_BACKEND == "tfserving":
+    # Optional dependency: tensorflow-serving-api is only needed for this backend
+    import grpc
+    from tensorflow_serving.apis import predict_pb2, prediction_service_pb2_grpc
+
+    try:
+        saved_model_version, exported = export_saved_model()
+        tf_serving_stub = prediction_service_pb2_grpc.PredictionServiceStub(
+            grpc.insecure_channel(TF_SERVING_GRPC_TARGET)
+        )
+        logger.info(
+            f"{'Exported' if exported else 'Reusing'} SavedModel version {saved_model_version} "
+            f"for TensorFlow Serving at {TF_SERVING_GRPC_TARGET}."
+        )
+    except Exception as e:
+        logger.error(f"Error initializing TensorFlow Serving client: {e}")
+        raise
+
 try:
     scaler = joblib.load(SCALER_MODEL_PATH)
     logger.info("Scaler loaded successfully.")
@@ -69,26 +299,57 @@ except Exception as e:
     logger.error(f"Error loading scaler: {e}")
     raise
 
+
+def extract_scaler_params(scaler):
+    """
+    Extracts the affine transform of a fitted scaler so it can be applied without scikit-learn.
+    Args:
+        scaler (MinMaxScaler | StandardScaler): Fitted scaler.
+    Returns:
+        tuple: (scale, offset, clip_range) such that transform(X) == X * scale + offset,
+            clipped to clip_range when it is not None.
+    """
+    if isinstance(scaler, MinMaxScaler):
+        clip_range = scaler.feature_range if scaler.clip else None
+        return scaler.scale_.astype(np.float32), scaler.min_.astype(np.float32), clip_range
+    if isinstance(scaler, StandardScaler):
+        n_features = scaler.n_features_in_
+        scale = 1.0 / scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        offset = -scaler.mean_ * scale if scaler.mean_ is not None else np.zeros(n_features)
+        return scale.astype(np.float32), offset.astype(np.float32), None
+    raise TypeError(f"Unsupported scaler type: {type(scaler).__name__}")
+
+
+try:
+    _scale, _offset, _clip_range = extract_scaler_params(scaler)
+except Exception as e:
+    logger.error(f"Error extracting scaler parameters: {e}")
+    raise
+
 # Database Initialization
 POSTGRES_DB = os.getenv("POSTGRES_DB")
 POSTGRES_USER = os.getenv("POSTGRES_USER")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST")
+POSTGRES_CONNECTION_TIMEOUT = 2.0  # seconds a flush waits for a pooled connection
 
 
 def init_db_pool():
     """
     Initializes a connection pool for PostgreSQL database.
     Returns:
-        psycopg2.pool.SimpleConnectionPool: Connection pool for PostgreSQL.
+        psycopg_pool.ConnectionPool: Connection pool for PostgreSQL.
     """
     try:
-        return psycopg2.pool.SimpleConnectionPool(
-            1, 10,
-            dbname=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD,
-            host=POSTGRES_HOST
+        return ConnectionPool(
+            conninfo=make_conninfo(
+                dbname=POSTGRES_DB,
+                user=POSTGRES_USER,
+                password=POSTGRES_PASSWORD,
+                host=POSTGRES_HOST
+            ),
+            min_size=1, max_size=10,
+            open=True
         )
     except Exception as e:
         logger.error(f"Error initializing database connection pool: {e}")
@@ -102,18 +363,154 @@ except Exception as e:
     logger.error(f"Failed to initialize database connection pool: {e}")
     raise
 
+
+def init_anomaly_table():
+    """
+    Creates the table holding inference results if it does not exist yet.
+    """
+    with db_pool.connection() as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS anomalies ("
+            "ts TIMESTAMP NOT NULL, err DOUBLE PRECISION NOT NULL, flag BOOLEAN NOT NULL)"
+        )
+
+
+try:
+    init_anomaly_table()
+except Exception as e:
+    logger.error(f"Error creating anomalies table: {e}")
+    raise
+
+scheduler = BackgroundScheduler()
+ANOMALY_FLUSH_INTERVAL = 1  # seconds between batched PostgreSQL writes
+
 # InfluxDB Configuration
 INFLUXDB_URL = "http://172.19.0.6:8086"
 INFLUXDB_TOKEN = os.getenv("INFLUXDB_ADMIN_TOKEN")
 INFLUXDB_ORG = os.getenv("INFLUXDB_INIT_ORG")
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET")
 client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN)
-write_api = client.write_api()
+# Batch points in a background thread so /infer never waits on an HTTP write
+write_api = client.write_api(write_options=WriteOptions(batch_size=500, flush_interval=1_000))
+
+# Streaming Quantile Estimation
+class P2Quantile:
+    """
+    Streaming quantile estimator using the P² algorithm (Jain & Chlamtac, 1985).
+    Five markers track the distribution, so beyond a short warmup sample no observations are
+    stored and updates are O(1).
+    """
+
+    def __init__(self, p, warmup=500):
+        """
+        Args:
+            p (float): Quantile to estimate, in (0, 1).
+            warmup (int): Number of initial observations answered exactly while the markers converge.
+        """
+        self.p = p
+        self.warmup = warmup
+        self.samples = []
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+        """
+        Adds an observation to the estimator.
+        Args:
+            x (float): New observation.
+        """
+        if self.samples is not None:
+            self.samples.append(x)
+            if len(self.samples) > self.warmup:
+                self.samples = None
+
+        heights, positions = self.heights, self.positions
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if x < heights[i + 1])
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, d)
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i, d):
+        heights, positions = self.heights, self.positions
+        return heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1])
+        )
+
+    def _linear(self, i, d):
+        heights, positions = self.heights, self.positions
+        return heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+
+    def quantile(self):
+        """
+        Returns the current quantile estimate (exact during warmup).
+        Returns:
+            float: Estimated quantile.
+        """
+        if self.samples is not None:
+            return np.percentile(self.samples, self.p * 100)
+        return self.heights[2]
+
 
 # Buffer Initialization
-data_buffer = {'x': [], 'y': [], 'z': [], 'acceleration': []}
 BUFFER_THRESHOLD = 100
-reconstruction_error_buffer = []
+data_buffer = np.empty((BUFFER_THRESHOLD, 4), dtype=np.float32)  # columns: x, y, z, acceleration
+data_buffer_idx = 0
+feature_buffer = np.empty(24, dtype=np.float32)  # reused across requests, see create_features_from_batch
+ANOMALY_PERCENTILE = 99
+error_quantile = P2Quantile(ANOMALY_PERCENTILE / 100)
+THRESHOLD_REFRESH_INTERVAL = 50  # requests between threshold recomputations
+THRESHOLD_REFRESH_SECONDS = 1.0
+anomaly_threshold = 0.0
+threshold_updates = 0
+threshold_refreshed_at = 0.0
+ANOMALY_ROWS_MAX = 100_000  # rows kept while PostgreSQL is unreachable; the oldest are dropped first
+anomaly_rows = deque(maxlen=ANOMALY_ROWS_MAX)  # (timestamp, reconstruction_error, anomaly_status) waiting for PostgreSQL
+anomaly_rows_lock = threading.Lock()  # shared by request appends and the scheduler's flush
+
+# Plot Initialization
+# One Agg canvas is reused for every plot: axes, ticks and labels are drawn once into a cached
+# background and only the data artists are redrawn on top of it
+PLOT_SERIES = (("X", "b"), ("Y", "g"), ("Z", "r"), ("Acceleration", "purple"))  # in data_buffer column order
+PLOT_CACHE_SIZE = int(os.getenv("PLOT_CACHE_SIZE", "256"))
+plot_figure = Figure(figsize=(10, 6))
+plot_canvas = FigureCanvasAgg(plot_figure)
+plot_axes = plot_figure.add_subplot()
+plot_lines = [plot_axes.plot([], label=label, color=color, animated=True)[0] for label, color in PLOT_SERIES]
+plot_annotation = plot_axes.annotate("Anomaly", (0, 0), animated=True)
+plot_background = None  # (x limits, y limits, saved canvas region) of the last full draw
+plot_lock = threading.Lock()
+plot_cache = OrderedDict()  # timestamp -> PNG bytes, least recently used first
+
+# Micro-batching Configuration
+BATCH_TIMEOUT = 0.005  # seconds to wait for more requests after the first one arrives
+inference_queue = None
 
 # Pydantic Models
 class InferenceResponse(BaseModel):
@@ -122,15 +519,57 @@ class InferenceResponse(BaseModel):
     anomaly_status: bool
 
 
-class SensorData(BaseModel):
+# Request Models
+# Decoded with msgspec instead of Pydantic: validating 24 nested objects per request is a large
+# share of /infer latency for a model this small
+class SensorData(msgspec.Struct):
     x_accelerometer_data: float
     y_accelerometer_data: float
     z_accelerometer_data: float
     acceleration_accelerometer_data: float
 
 
-class SensorBatch(BaseModel):
-    data: list[SensorData]
+class SensorBatch(msgspec.Struct):
+    data: Annotated[list[SensorData], msgspec.Meta(min_length=24, max_length=24)]
+
+
+sensor_batch_decoder = msgspec.json.Decoder(SensorBatch)
+
+
+def inline_schema_refs(schema, defs):
+    """
+    Replaces local "#/$defs/..." references in a msgspec JSON schema with their definitions,
+    so the schema can be embedded in the OpenAPI document.
+    Args:
+        schema: JSON schema fragment.
+        defs (dict): Definitions from the schema's "$defs".
+    Returns:
+        Schema fragment without references.
+    """
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return inline_schema_refs(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+        return {key: inline_schema_refs(value, defs) for key, value in schema.items() if key != "$defs"}
+    if isinstance(schema, list):
+        return [inline_schema_refs(value, defs) for value in schema]
+    return schema
+
+
+_sensor_batch_schema = msgspec.json.schema(SensorBatch)
+SENSOR_BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": inline_schema_refs(_sensor_batch_schema, _sensor_batch_schema.get("$defs", {}))
+            }
+        },
+    }
+}
+
+# Raw request layout for /infer_raw: 24 rows of (x, y, z, acceleration) little-endian float32
+RAW_SAMPLE_DTYPE = np.dtype("<f4")
+RAW_BATCH_BYTES = 24 * 4 * RAW_SAMPLE_DTYPE.itemsize
 
 
 # Helper Functions
@@ -138,94 +577,382 @@ def reset_data_buffer():
     """
     Resets the data buffer used for batch data accumulation.
     """
-    global data_buffer
-    data_buffer = {'x': [], 'y': [], 'z': [], 'acceleration': []}
-    logger.info("Data buffer has been reset.")
+    global data_buffer_idx
+    data_buffer_idx = 0
+    logger.debug("Data buffer has been reset.")
 
 
-def create_features_from_batch(batch_data):
+@njit(cache=True)
+def _batch_features(arr, features):
+    """
+    Computes the feature vector from an (n, 4) array of x, y, z, acceleration samples.
+    Mean and the second to fourth central moments are accumulated in a single Welford pass.
+    Args:
+        arr (np.ndarray): Sensor samples of shape (n, 4).
+        features (np.ndarray): Output array of shape (24,) that receives the feature vector.
+    """
+    n = arr.shape[0]
+    mean = np.zeros(4)
+    m2 = np.zeros(4)
+    m3 = np.zeros(4)
+    m4 = np.zeros(4)
+    for i in range(n):
+        k = i + 1
+        for j in range(4):
+            delta = arr[i, j] - mean[j]
+            delta_n = delta / k
+            delta_n2 = delta_n * delta_n
+            term = delta * delta_n * i
+            mean[j] += delta_n
+            m4[j] += term * delta_n2 * (k * k - 3 * k + 3) + 6 * delta_n2 * m2[j] - 4 * delta_n * m3[j]
+            m3[j] += term * delta_n * (k - 2) - 3 * delta_n * m2[j]
+            m2[j] += term
+
+    # Feature layout expected by the scaler: last (acc, x, y, z), then stats (x, acc, y, z)
+    for slot, j in enumerate((3, 0, 1, 2)):
+        features[slot] = arr[n - 1, j]
+    for slot, j in enumerate((0, 3, 1, 2)):
+        # Bias-corrected skew/kurt to match pandas' Series.skew()/kurt(), which report 0 for flat channels
+        if m2[j] == 0.0:
+            skewness = 0.0
+            kurt = 0.0
+        else:
+            g1 = np.sqrt(n) * m3[j] / m2[j] ** 1.5
+            g2 = n * m4[j] / (m2[j] * m2[j]) - 3.0
+            skewness = g1 * np.sqrt(n * (n - 1.0)) / (n - 2.0)
+            kurt = ((n + 1.0) * g2 + 6.0) * (n - 1.0) / ((n - 2.0) * (n - 3.0))
+        base = 4 + 5 * slot
+        features[base] = mean[j]
+        features[base + 1] = np.sqrt(m2[j] / n)
+        features[base + 2] = arr[n - 1, j] - mean[j]
+        features[base + 3] = skewness
+        features[base + 4] = kurt
+
+
+# Compile ahead of the first request, for JSON batches (float64) and raw batches (read-only float32)
+_batch_features(np.zeros((24, 4)), feature_buffer)
+_batch_features(np.frombuffer(bytes(RAW_BATCH_BYTES), dtype=RAW_SAMPLE_DTYPE).reshape(24, 4), feature_buffer)
+
+
+def buffer_samples(samples):
+    """
+    Appends sensor samples to the visualization buffer.
+    Args:
+        samples (np.ndarray): Samples of shape (n, 4).
+    Returns:
+        np.ndarray | None: Copy of the buffer once BUFFER_THRESHOLD samples have been collected, otherwise None.
+    """
+    global data_buffer_idx
+    full_buffer = None
+    start = 0
+    while start < len(samples):
+        count = min(len(samples) - start, BUFFER_THRESHOLD - data_buffer_idx)
+        data_buffer[data_buffer_idx:data_buffer_idx + count] = samples[start:start + count]
+        data_buffer_idx += count
+        start += count
+        if data_buffer_idx == BUFFER_THRESHOLD:
+            # Copy so the plot can render in a worker thread while new samples overwrite the buffer
+            full_buffer = data_buffer.copy()
+            reset_data_buffer()
+    return full_buffer
+
+
+def batch_to_array(batch_data):
+    """
+    Converts a batch of sensor data objects into a sample array.
+    Args:
+        batch_data (list[SensorData]): Batch of sensor data objects.
+    Returns:
+        np.ndarray: Samples of shape (n, 4) with columns x, y, z, acceleration.
+    """
+    return np.fromiter(
+        (v for d in batch_data for v in (
+            d.x_accelerometer_data, d.y_accelerometer_data,
+            d.z_accelerometer_data, d.acceleration_accelerometer_data
+        )),
+        dtype=np.float64, count=len(batch_data) * 4
+    ).reshape(-1, 4)
+
+
+def create_features_from_batch(samples):
     """
     Creates feature vectors from a batch of sensor data.
     Args:
-        batch_data (list[SensorData]): Batch of 24 sensor data objects.
+        samples (np.ndarray): Batch of 24 samples of shape (24, 4), columns x, y, z, acceleration.
+    Returns:
+        np.ndarray: Feature vector of shape (24,). This is the shared feature_buffer, so it is only
+            valid until the next call and must be consumed before the request awaits.
+    """
+    _batch_features(samples, feature_buffer)
+    return feature_buffer
+
+
+def get_anomaly_threshold(error):
+    """
+    Records a reconstruction error and returns the cached anomaly threshold.
+    The threshold is recomputed on each of the first THRESHOLD_REFRESH_INTERVAL errors, then only
+    every THRESHOLD_REFRESH_INTERVAL errors or THRESHOLD_REFRESH_SECONDS, since one new sample barely
+    moves a high percentile.
+    Args:
+        error (float): Latest reconstruction error.
+    Returns:
+        float: Anomaly threshold.
+    """
+    global anomaly_threshold, threshold_updates, threshold_refreshed_at
+    # A NaN or infinite error would corrupt the estimator markers for the rest of the process
+    if not math.isfinite(error):
+        logger.warning(f"Skipping non-finite reconstruction error in threshold update: {error}")
+        return anomaly_threshold
+    error_quantile.update(error)
+    threshold_updates += 1
+    now = time.monotonic()
+    if (
+        threshold_updates <= THRESHOLD_REFRESH_INTERVAL
+        or threshold_updates % THRESHOLD_REFRESH_INTERVAL == 0
+        or now - threshold_refreshed_at >= THRESHOLD_REFRESH_SECONDS
+    ):
+        anomaly_threshold = error_quantile.quantile()
+        threshold_refreshed_at = now
+    return anomaly_threshold
+
+
+def scale_features(features):
+    """
+    Applies the fitted scaler to a feature vector and shapes it for the autoencoder.
+    Args:
+        features (np.ndarray): Float32 feature vector of shape (24,).
+    Returns:
+        np.ndarray: Scaled float32 features of shape (1, 24, 1).
+    """
+    scaled = features * _scale + _offset
+    if _clip_range is not None:
+        np.clip(scaled, _clip_range[0], _clip_range[1], out=scaled)
+    return scaled.reshape(1, 24, 1)
+
+
+def compute_reconstruction_errors(scaled_features):
+    """
+    Computes autoencoder reconstruction errors with the configured inference backend.
+    Args:
+        scaled_features (np.ndarray): Scaled features of shape (n, 24, 1).
     Returns:
-        np.ndarray: Feature vector of shape (24,).
+        np.ndarray: Mean absolute reconstruction error per window, shape (n,).
+    """
+    if AUTOENCODER_BACKEND == "onnx":
+        return sess.run(None, {in_name: scaled_features.astype(np.float32, copy=False)})[0]
+    if AUTOENCODER_BACKEND == "tfserving":
+        request = predict_pb2.PredictRequest()
+        request.model_spec.name = TF_SERVING_MODEL_NAME
+        request.model_spec.signature_name = "serving_default"
+        request.inputs["x"].CopyFrom(tf.make_tensor_proto(scaled_features, dtype=tf.float32))
+        response = tf_serving_stub.Predict(request, timeout=TF_SERVING_TIMEOUT)
+        return tf.make_ndarray(response.outputs["output_0"])
+    # Keras backend: XLA compiles once per input shape, so pad batches up to a power of two to bound recompilation
+    n = len(scaled_features)
+    padded = np.zeros((1 << (n - 1).bit_length(), 24, 1), dtype=np.float32)
+    padded[:n] = scaled_features
+    return _infer_err(tf.constant(padded)).numpy()[:n]
+
+
+def flush_anomaly_rows():
     """
-    def statistical_features(data):
-        return [
-            np.mean(data), np.std(data),
-            data[-1] - np.mean(data), pd.Series(data).skew(), pd.Series(data).kurt()
-        ]
-    acceleration = [data.acceleration_accelerometer_data for data in batch_data]
-    x = [data.x_accelerometer_data for data in batch_data]
-    y = [data.y_accelerometer_data for data in batch_data]
-    z = [data.z_accelerometer_data for data in batch_data]
+    Writes queued inference results to PostgreSQL with a single COPY.
+    """
+    with anomaly_rows_lock:
+        rows = list(anomaly_rows)
+        anomaly_rows.clear()
+    if not rows:
+        return
+    try:
+        with db_pool.connection(timeout=POSTGRES_CONNECTION_TIMEOUT) as conn, conn.cursor() as cur:
+            with cur.copy("COPY anomalies (ts, err, flag) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+    except Exception as e:
+        # Put the rows back for the next flush, dropping the oldest if the queue is nearly full.
+        # Holding the lock keeps appends out, so extendleft cannot evict rows queued since the drain.
+        with anomaly_rows_lock:
+            room = ANOMALY_ROWS_MAX - len(anomaly_rows)
+            requeued = rows[-room:] if room > 0 else []
+            anomaly_rows.extendleft(reversed(requeued))
+        logger.error(
+            f"Error writing {len(rows)} anomaly rows to PostgreSQL, "
+            f"requeued {len(requeued)} and dropped {len(rows) - len(requeued)}: {e}"
+        )
+
 
-    features = [
-        acceleration[-1], x[-1], y[-1], z[-1],
-        *statistical_features(x), *statistical_features(acceleration),
-        *statistical_features(y), *statistical_features(z)
-    ]
-    return np.array(features)
+async def inference_batcher():
+    """
+    Collects queued inference requests into micro-batches and runs each batch through the autoencoder at once.
+    Queue items are (scaled_features, future) pairs; every future receives its window's reconstruction error.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await inference_queue.get()]
+        deadline = loop.time() + BATCH_TIMEOUT
+        while len(batch) < MAX_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(inference_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            errors = await asyncio.to_thread(compute_reconstruction_errors, np.concatenate([item[0] for item in batch]))
+        except Exception as e:
+            logger.error(f"Error running inference batch: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(float(errors[i]))
 
 
 def generate_plot(data_buffer, reconstruction_error, is_anomaly, timestamp):
     """
     Generates a plot from buffered data and highlights anomalies.
     Args:
-        data_buffer (dict): Accumulated sensor data.
+        data_buffer (np.ndarray): Accumulated sensor data of shape (n, 4).
         reconstruction_error (float): Reconstruction error value.
         is_anomaly (bool): Whether the data indicates an anomaly.
         timestamp (datetime): Timestamp of the data.
     Returns:
-        bytes: Binary image data for the plot.
+        bytes: PNG image data for the plot.
     """
+    global plot_background
     try:
-        fig, ax = plt.subplots(figsize=(10, 6))
-        x_vals = [item[1] for item in data_buffer['x']]
-        y_vals = [item[1] for item in data_buffer['y']]
-        z_vals = [item[1] for item in data_buffer['z']]
-        acceleration_vals = [item[1] for item in data_buffer['acceleration']]
-        ax.plot(x_vals, label="X", color="b")
-        ax.plot(y_vals, label="Y", color="g")
-        ax.plot(z_vals, label="Z", color="r")
-        ax.plot(acceleration_vals, label="Acceleration", color="purple")
-        if is_anomaly:
-            anomaly_idx = len(acceleration_vals) - 1
-            ax.annotate("Anomaly", (anomaly_idx, acceleration_vals[-1]))
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close(fig)
-        buf.seek(0)
-        return buf
+        with plot_lock:
+            n = len(data_buffer)
+            x_vals = np.arange(n)
+            for j, line in enumerate(plot_lines):
+                line.set_data(x_vals, data_buffer[:, j])
+            x_limits = (0, max(n - 1, 1))
+            y_min = float(data_buffer.min())
+            y_max = float(data_buffer.max())
+
+            # Redraw the background only when the data no longer fits (or badly underfills) the cached axes
+            if (
+                plot_background is None
+                or plot_background[0] != x_limits
+                or not plot_background[1][0] <= y_min <= y_max <= plot_background[1][1]
+                or y_max - y_min < 0.5 * (plot_background[1][1] - plot_background[1][0])
+            ):
+                margin = 0.1 * (y_max - y_min) or 1.0
+                plot_axes.set_xlim(*x_limits)
+                plot_axes.set_ylim(y_min - margin, y_max + margin)
+                plot_canvas.draw()
+                plot_background = (x_limits, plot_axes.get_ylim(), plot_canvas.copy_from_bbox(plot_figure.bbox))
+            else:
+                plot_canvas.restore_region(plot_background[2])
+
+            for line in plot_lines:
+                plot_axes.draw_artist(line)
+            if is_anomaly:
+                anomaly_point = (n - 1, float(data_buffer[-1, 3]))
+                plot_annotation.xy = anomaly_point
+                plot_annotation.set_position(anomaly_point)
+                plot_axes.draw_artist(plot_annotation)
+
+            buf = io.BytesIO()
+            Image.fromarray(np.asarray(plot_canvas.buffer_rgba())).save(buf, format='png')
+        return buf.getvalue()
     except Exception as e:
         logger.error(f"Error generating plot: {e}")
         raise
 
 
+async def flush_plot(plot_data, reconstruction_error, is_anomaly, timestamp):
+    """
+    Renders a full visualization buffer off the event loop and caches the PNG for /plot/{timestamp},
+    evicting the least recently used plot once PLOT_CACHE_SIZE is exceeded.
+    Args:
+        plot_data (np.ndarray): Snapshot of the full data buffer.
+        reconstruction_error (float): Reconstruction error value.
+        is_anomaly (bool): Whether the data indicates an anomaly.
+        timestamp (datetime): Timestamp of the data.
+    """
+    png = await asyncio.to_thread(generate_plot, plot_data, reconstruction_error, is_anomaly, timestamp)
+    plot_cache[timestamp.isoformat()] = png
+    if len(plot_cache) > PLOT_CACHE_SIZE:
+        plot_cache.popitem(last=False)
+
+
+async def detect_anomaly(samples):
+    """
+    Runs anomaly detection on one batch of sensor samples and records the result.
+    Args:
+        samples (np.ndarray): Samples of shape (24, 4), columns x, y, z, acceleration.
+    Returns:
+        InferenceResponse: Anomaly detection results.
+    """
+    features = create_features_from_batch(samples)
+    scaled_features = scale_features(features)
+    future = asyncio.get_running_loop().create_future()
+    await inference_queue.put((scaled_features, future))
+    error = await future
+    threshold = get_anomaly_threshold(error)
+    is_anomaly = bool(error > threshold)
+    timestamp = datetime.datetime.now()
+    # Store anomaly data in databases
+    with anomaly_rows_lock:
+        anomaly_rows.append((timestamp, error, is_anomaly))
+    write_api.write(
+        bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG,
+        # influxdb-client reads naive datetimes as UTC, so attach the host's local offset
+        record=Point("anomaly").field("err", error).field("flag", int(is_anomaly)).time(timestamp.astimezone())
+    )
+    # Accumulate data for visualization; plotting is best-effort and must not fail the request
+    plot_data = buffer_samples(samples)
+    if plot_data is not None:
+        try:
+            await flush_plot(plot_data, error, is_anomaly, timestamp)
+        except Exception as e:
+            logger.warning(f"Plot for {timestamp.isoformat()} was not generated: {e}")
+    return InferenceResponse(timestamp=timestamp.isoformat(), reconstruction_error=error, anomaly_status=is_anomaly)
+
+
 # FastAPI Endpoints
-@app.post('/infer', response_model=InferenceResponse)
-async def infer(batch: SensorBatch):
+@app.post('/infer', response_model=InferenceResponse, openapi_extra=SENSOR_BATCH_OPENAPI)
+async def infer(request: Request):
     """
     Processes a batch of sensor data to detect anomalies.
     Args:
-        batch (SensorBatch): Batch of 24 sensor data points.
+        request (Request): Request whose JSON body is a SensorBatch of 24 sensor data points.
     Returns:
         InferenceResponse: Anomaly detection results.
     """
     try:
-        features = create_features_from_batch(batch.data)
-        scaled_features = scaler.transform(features.reshape(1, -1)).reshape(1, 24, 1)
-        reconstruction = autoencoder.predict(scaled_features)
-        error = np.mean(np.abs(reconstruction - scaled_features))
-        reconstruction_error_buffer.append(error)
-        threshold = np.percentile(reconstruction_error_buffer, 99)
-        is_anomaly = error > threshold
-        timestamp = datetime.datetime.now()
-        # Accumulate data for visualization
-        reset_data_buffer()
-        # Store anomaly data in databases
-        return InferenceResponse(timestamp=timestamp.isoformat(), reconstruction_error=error, anomaly_status=is_anomaly)
+        batch = sensor_batch_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid sensor batch: {e}")
+    try:
+        return await detect_anomaly(batch_to_array(batch.data))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Inference error: {str(e)}")
+
+
+@app.post('/infer_raw', response_model=InferenceResponse)
+async def infer_raw(request: Request):
+    """
+    Processes a batch of sensor data sent as raw bytes to detect anomalies.
+    Args:
+        request (Request): Request whose application/octet-stream body holds 24 rows of little-endian
+            float32 (x, y, z, acceleration) values, row-major.
+    Returns:
+        InferenceResponse: Anomaly detection results.
+    """
+    raw = await request.body()
+    if len(raw) != RAW_BATCH_BYTES:
+        raise HTTPException(status_code=422, detail=f"Expected {RAW_BATCH_BYTES} bytes, got {len(raw)}.")
+    samples = np.frombuffer(raw, dtype=RAW_SAMPLE_DTYPE).reshape(24, 4)
+    if not np.isfinite(samples).all():
+        raise HTTPException(status_code=422, detail="Sensor batch contains NaN or infinite values.")
+    try:
+        return await detect_anomaly(samples)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Inference error: {str(e)}")
 
@@ -237,9 +964,10 @@ async def serve_plot(timestamp: str):
     Args:
         timestamp (str): Timestamp for the plot.
     Returns:
-        StreamingResponse: Binary image response.
+        Response: PNG image response.
     """
-    try:
-        return StreamingResponse(open(f"/tmp/plot_{timestamp}.png", "rb"), media_type="image/png")
-    except FileNotFoundError:
+    png = plot_cache.get(timestamp)
+    if png is None:
         raise HTTPException(status_code=404, detail="Plot not found.")
+    plot_cache.move_to_end(timestamp)
+    return Response(content=png, media_type="image/png")